@@ -1,7 +1,43 @@
-from flask import request, Response
+from flask import request, Response, stream_with_context
+from werkzeug.wrappers import Response as BaseResponse
 import json
 from bson.timestamp import Timestamp
 import datetime
+import functools
+import math
+import sys
+import traceback
+import uuid
+import weakref
+from typing import Any, Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional, Sequence, Tuple
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+try:
+    import ujson
+except ImportError:
+    ujson = None  # type: ignore[assignment]
+
+_View = Callable[..., Any]
+_Spec = Tuple[str, Optional[str]]
+_Validator = Callable[[MutableMapping[str, Any]], Dict[str, str]]
+
+
+def _default(obj: Any) -> Any:
+    """
+    Fallback serializer for the objects not natively handled by the json encoder
+    """
+    if isinstance(obj, Timestamp):
+        obj = obj.as_datetime()
+    # dates, times and uuids are encoded natively by orjson, with the same output
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return "<bytes>"
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
 
 
 class _JSONEncoder(json.JSONEncoder):
@@ -9,56 +45,200 @@ class _JSONEncoder(json.JSONEncoder):
     JSON Encoder to handle datetime.datetime objects
     """
     #pylint: disable=E0202
-    def default(self, obj):
-        if isinstance(obj, Timestamp):
-            obj = obj.as_datetime()
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat()
-        if isinstance(obj, bytes):
-            return "<bytes>"
-        return json.JSONEncoder.default(self, obj)
+    def default(self, obj: Any) -> Any:
+        return _default(obj)
+
+
+def _encode_json(value: Any) -> bytes:
+    return json.dumps(value, cls=_JSONEncoder, separators=(",", ":"), ensure_ascii=False).encode()
+
 
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_FINGERPRINT_MAX_ITEMS = 16
 
-def encode_json(value):
-    return json.dumps(value, cls=_JSONEncoder)
 
+def _fingerprint(value: Any) -> Optional[Tuple[type, Tuple[Any, ...]]]:
+    """
+    Hashable key identifying a small flat dict or list of scalars, None if the value can not be cached.
+    The type of each item is part of the key so that 1, 1.0 and True are not mixed up, as is the sign of float keys and values for 0.0 and -0.0.
+    """
+    container = type(value)
+    if container is dict:
+        items = value.items()
+    elif container is list or container is tuple:
+        items = enumerate(value)
+    else:
+        return None
+    if len(value) > _FINGERPRINT_MAX_ITEMS:
+        return None
+    key = []
+    for k, v in items:
+        if type(k) not in _SCALAR_TYPES or type(v) not in _SCALAR_TYPES:
+            return None
+        # 0.0 == -0.0 with the same hash, the sign must be part of the key
+        key_sign = math.copysign(1, k) if type(k) is float else 1
+        sign = math.copysign(1, v) if type(v) is float else 1
+        key.append((type(k), key_sign, k, type(v), sign, v))
+    return container, tuple(key)
+
+
+@functools.lru_cache(maxsize=256)
+def _encode_fingerprint(fingerprint: Tuple[type, Tuple[Any, ...]]) -> bytes:
+    container, items = fingerprint
+    if container is dict:
+        return _encode_json({k: v for _, _, k, _, _, v in items})
+    return _encode_json([v for _, _, _, _, _, v in items])
+
+
+def _dumps_json_cached(value: Any) -> bytes:
+    fingerprint = _fingerprint(value)
+    if fingerprint is None:
+        return _encode_json(value)
+    return _encode_fingerprint(fingerprint)
+
+
+def _dumps_ujson(value: Any) -> bytes:
+    return ujson.dumps(value, default=_default, escape_forward_slashes=False, ensure_ascii=False).encode()
+
+
+def _dumps_orjson(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except orjson.JSONEncodeError:
+        # values orjson refuses but json accepts, such as integers beyond 64 bits
+        return _encode_json(value)
+
+
+# encode to utf-8 json bytes with the fastest available library, all of them producing the same compact output
+# except for NaN and Infinity (null with orjson) and Decimal (only accepted by ujson)
+_dumps: Callable[[Any], bytes]
+if orjson is not None:
+    _dumps = _dumps_orjson
+elif ujson is not None:
+    _dumps = _dumps_ujson
+else:
+    _dumps = _encode_json
+# the cache only pays off against the stdlib encoder, orjson and ujson are faster than computing the fingerprint
+_dumps_cached: Callable[[Any], bytes] = _dumps_json_cached if _dumps is _encode_json else _dumps
+
+
+def encode_json(value: Any) -> str:
+    """
+    Encode the value to a compact json str, the output being the same whichever json library is installed
+    except for NaN and Infinity, encoded as null by orjson, and Decimal, only accepted by ujson.
+    """
+    return _dumps(value).decode()
 
-def catch(func):
+
+def catch(func: _View) -> _View:
     """Decorator to catch exceptions and return a meaningful traceback"""
-    def __callback__(*args, **kwargs):
+    @functools.wraps(func)
+    def __callback__(*args: Any, **kwargs: Any) -> Any:
         try:
             return func(*args, **kwargs)
-        except:
-            import traceback
-            import sys
+        except Exception:
             error = traceback.format_exc()
             print(error, file=sys.stderr)
             return str(error), 500
     return __callback__
 
 
-def json_request(func):
+def json_request(func: _View) -> _View:
     """
     Decorator to pass the decoded json body of the request as a dict to the endpoint method.
+    The body is decoded once per request; any other code reading it should use
+    request.get_json(cache=True) to reuse the same decoded value.
     
     >>> @json_request
     >>> def my_endpoint(body: dict) -> str:
     >>>         return body.get("property_1")
     """
-    def __callback__(*args, **kwargs):
-        if type(request.json) is dict:
-            body = request.json
-        elif request.json is None:
-            body = None
-        else:
-            body = request.json()
-        if body is None:
+    @functools.wraps(func)
+    def __callback__(*args: Any, **kwargs: Any) -> Any:
+        body = request.get_json(silent=True, cache=True)
+        if not isinstance(body, dict):
             # raise AssertionError("Request body is not application/json")
-            return Response("Request body is not application/json", 406)
+            return Response("Request body is not an application/json object", 406)
         return func(body, *args, **kwargs)
     return __callback__
 
 
+_TYPES: Dict[str, Any] = {
+    "any": "any",
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "datetime": str
+}
+_VALID_TYPE_NAMES = ' '.join(_TYPES.keys())
+
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    """Parse the date and datetime formats accepted by the datetime type of json_request_required."""
+    value = value.replace("/", "-")
+    if "T" in value:
+        value = value[:-1] if value.endswith("Z") else value
+        if "." in value:
+            return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+    return datetime.datetime.strptime(value, "%Y-%m-%d")
+
+
+def _parse_required(required: Iterable[Any]) -> Tuple[_Spec, ...]:
+    """
+    Parse the required "type:key" declarations into (key, type name) pairs, the type name being None for untyped keys.
+    Raise an AssertionError for unknown type names so misconfigured endpoints fail when they are declared.
+    """
+    specs: List[_Spec] = []
+    for key in required:
+        key = str(key)
+        _type_name: Optional[str] = None
+        if ":" in key:
+            _type_name, key = key.split(":", 1)
+            _type_name = _type_name.lower()
+            if _type_name == "any":
+                _type_name = None
+            elif _type_name not in _TYPES:
+                raise AssertionError(_type_name + " is not a valid type. The valid types are: " + _VALID_TYPE_NAMES + ".")
+        specs.append((key, _type_name))
+    return tuple(specs)
+
+
+def _compile_validator(specs: Iterable[_Spec]) -> _Validator:
+    """
+    Generate a function validating a json body against the parsed required declarations.
+    The generated function only performs the checks themselves, with no declaration lookup left.
+    """
+    namespace: Dict[str, Any] = {"_parse_datetime": _parse_datetime}
+    lines = ["def _verify(obj):", "    errors = {}"]
+    for index, (key, _type_name) in enumerate(specs):
+        _key = repr(key)
+        lines.append("    if {0} not in obj:".format(_key))
+        lines.append("        errors[{0}] = 'missing'".format(_key))
+        if _type_name is None:
+            continue
+        _type = _TYPES[_type_name]
+        namespace["_type_{0}".format(index)] = _type
+        if _type is int:
+            # bool is a subclass of int but must not be accepted as one
+            lines.append("    elif not isinstance(obj[{0}], int) or isinstance(obj[{0}], bool):".format(_key))
+        else:
+            lines.append("    elif not isinstance(obj[{0}], _type_{1}):".format(_key, index))
+        lines.append("        errors[{0}] = {1}".format(_key, repr("is not of type " + _type_name)))
+        if _type_name == "datetime":
+            lines.append("    else:")
+            lines.append("        try:")
+            lines.append("            obj[{0}] = _parse_datetime(obj[{0}])".format(_key))
+            lines.append("        except ValueError:")
+            lines.append("            errors[{0}] = '{{0}} is not compatible to {1}'.format(obj[{0}])".format(_key, _type_name))
+    lines.append("    return errors")
+    exec("\n".join(lines), namespace)
+    return namespace["_verify"]
+
+
 class json_request_required:
     """
     Decorator to pass the decoded json body of the request as a dict to the endpoint method.
@@ -68,159 +248,116 @@ class json_request_required:
     >>> def my_endpoint(body: dict) -> str:
     >>>         return body["name"]        # safe
     """
-    def __init__(self, *args):
+    def __init__(self, *args: Any) -> None:
         self.required = args
+        required: Sequence[Any] = args
+        if len(required) > 0 and isinstance(required[0], (tuple, list)):
+            required = required[0]
+        self._specs = _parse_required(required)
+        self._verify = _compile_validator(self._specs)
 
     @staticmethod
-    def verify_json(obj, required):
+    def verify_json(obj: MutableMapping[str, Any], required: Iterable[Any]) -> Dict[str, str]:
         """
         Static method to validate that the json body contains at least the required properties.
+        Slow path kept for direct callers, the decorator uses the validator compiled from its declarations.
         """
-        # import datetime
-        errors = {}
-        __types = {
-            "any": "any",
-            "str": str,
-            "int": int,
-            "float": float,
-            "bool": bool,
-            "list": list,
-            "dict": dict,
-            "datetime": str
-        }
-        for key in required:
-            key = str(key)
-            _type_name = None
-            
-            # Validate the declaration of the required property to follow the pattern type:key
-            if ":" in key:
-                _type_name, key = key.split(":")
-                _type_name = _type_name.lower()
-            
+        errors: Dict[str, str] = {}
+        for key, _type_name in _parse_required(required):
             if key not in obj:
                 errors[key] = "missing"
-            elif _type_name is not None and _type_name != "any":
-                _type = __types.get(_type_name)
-                if _type is None:
-                    raise AssertionError(_type_name + " is not a valid type. The valid types are: " + ' '.join(__types.keys()) + ".")
-                elif type(obj[key]) is not _type:
+            elif _type_name is not None:
+                _type = _TYPES[_type_name]
+                if not isinstance(obj[key], _type) or (_type is int and isinstance(obj[key], bool)):
                     errors[key] = "is not of type " + _type_name
-                if _type_name == "datetime":
-                    _value = obj[key]
-                    _value = _value.replace("/", "-")
+                elif _type_name == "datetime":
                     try:
-                        if "T" in _value:
-                            _value: str = _value[:-1] if _value.endswith("Z") else _value
-                            if "." in _value:
-                                obj[key] = datetime.datetime.strptime(_value, "%Y-%m-%dT%H:%M:%S.%f")
-                            else:
-                                obj[key] = datetime.datetime.strptime(_value, "%Y-%m-%dT%H:%M:%S")
-                        else:
-                            obj[key] = datetime.datetime.strptime(_value, "%Y-%m-%d")
-                    except:
-                        errors[key] = "{0} is not compatible to {1}".format(_value, _type_name)
+                        obj[key] = _parse_datetime(obj[key])
+                    except ValueError:
+                        errors[key] = "{0} is not compatible to {1}".format(obj[key], _type_name)
         return errors
 
-    def __verify_json(self, obj):
-        required = self.required
-        if len(required) == 0:
-            return {}
-        if isinstance(required[0], (tuple, list)):
-            required = required[0]
-        return json_request_required.verify_json(obj, required)
-
-    def __call__(self, func):
-        def __callback__(body, *args, **kwargs):
-            result = self.__verify_json(body)
+    def __call__(self, func: _View) -> _View:
+        verify = self._verify
+        @functools.wraps(func)
+        def __callback__(*args: Any, **kwargs: Any) -> Any:
+            # same body handling as json_request, inlined to avoid a second wrapper call per request
+            body = request.get_json(silent=True, cache=True)
+            if not isinstance(body, dict):
+                return Response("Request body is not an application/json object", 406)
+            result = verify(body)
             if result:
                 raise AssertionError("Some keys did not meet the requirements: {0}".format(result))
             return func(body, *args, **kwargs)
-        return json_request(__callback__)
+        return __callback__
 
 
-def querystring_request(func):
-    """
+def _request_attribute_decorator(name: str, attribute: str, doc: str) -> Callable[[_View], _View]:
+    """Create the decorator `name` passing the given attribute of the flask request to the endpoint method."""
+    def __decorator(func: _View) -> _View:
+        @functools.wraps(func)
+        def __callback__(*args: Any, **kwargs: Any) -> Any:
+            return func(getattr(request, attribute), *args, **kwargs)
+        return __callback__
+    __decorator.__name__ = __decorator.__qualname__ = name
+    __decorator.__doc__ = doc
+    return __decorator
+
+
+querystring_request = _request_attribute_decorator("querystring_request", "args", """
     Decorator to pass the querystring dict to the endpoint method.
     
     >>> @querystring_request
     >>> def my_endpoint(querystring: dict) -> str:
     >>>         return querystring.get("property_1")
-    """
-    def __callback__(*args, **kwargs):
-        qs = request.args
-        if qs is None:
-            qs = {}
-        return func(qs, *args, **kwargs)
-    return __callback__
+    """)
 
-
-def headers_request(func):
-    """
+headers_request = _request_attribute_decorator("headers_request", "headers", """
     Decorator to pass the headers dict to the endpoint method.
     
     >>> @headers_request
     >>> def my_endpoint(headers: dict) -> str:
     >>>         return headers.get("property_1")
-    """
-    def __callback__(*args, **kwargs):
-        headers = request.headers
-        if headers is None:
-            headers = {}
-        return func(headers, *args, **kwargs)
-    return __callback__
-
+    """)
 
-def cookies_request(func):
-    """
+cookies_request = _request_attribute_decorator("cookies_request", "cookies", """
     Decorator to pass the cookies dict to the endpoint method.
     
     >>> @cookies_request
     >>> def my_endpoint(cookies: dict) -> str:
     >>>         return cookies.get("property_1")
-    """
-    def __callback__(*args, **kwargs):
-        cookies = request.cookies
-        if cookies is None:
-            cookies = {}
-        return func(cookies, *args, **kwargs)
-    __callback__.__name__ = func.__name__ + str(id(__callback__))
-    return __callback__
-
+    """)
 
-def body_request(func):
-    """
-    Decorator to pass the raw body to the endpoint method.
+body_request = _request_attribute_decorator("body_request", "data", """
+    Decorator to pass the raw body bytes to the endpoint method.
     
     >>> @body_request
-    >>> def my_endpoint(body: dict) -> str:
-    >>>         return body.get("property_1")
-    """
-    def __callback__(*args, **kwargs):
-        body = request.data
-        if body is None:
-            body = {}
-        return func(body, *args, **kwargs)
-    __callback__.__name__ = func.__name__ + str(id(__callback__))
-    return __callback__
+    >>> def my_endpoint(body: bytes) -> str:
+    >>>         return body.decode()
+    """)
 
 
-def mime_type_response(mimetype, encoder=None):
-    def __wrap(func):
-        def __callback__(*args, **kwargs):
+def mime_type_response(mimetype: str, encoder: Optional[Callable[[Any], Any]] = None) -> Callable[[_View], _View]:
+    def __wrap(func: _View) -> _View:
+        @functools.wraps(func)
+        def __callback__(*args: Any, **kwargs: Any) -> Any:
             result = func(*args, **kwargs)
-            if not isinstance(result, (list, tuple)):
-                result = result, 200
-            
-            if len(result) == 0:
-                result = "", 200
-            elif len(result) == 1:
-                result = result[0], 200
+            if isinstance(result, BaseResponse):
+                # already a response object (redirect, stream, pre-encoded payload...)
+                return result
+            body, status = result, 200
+            if isinstance(result, (list, tuple)):
+                if len(result) > 1:
+                    body, status = result[0], result[1]
+                else:
+                    body = result[0] if result else ""
             
             if encoder is not None:
-                result = encoder(result[0]), result[1]
+                body = encoder(body)
+            # str/bytes bodies are stored as is and werkzeug fills Content-Length from their length
             return Response(
-                response=result[0],
-                status=result[1],
+                response=body,
+                status=status,
                 mimetype=mimetype
             )
         
@@ -229,7 +366,7 @@ def mime_type_response(mimetype, encoder=None):
     return __wrap
 
 
-def json_response(func):
+def json_response(func: _View) -> _View:
     """
     Decorator to return the appropriate json response object from anything decodable to json.
     
@@ -240,28 +377,96 @@ def json_response(func):
     Response('{"name":"Test","grades":[10,8,5]}', status=200, mimetype='application/json')
     """
 
-    return mime_type_response("application/json", encoder=encode_json)(func)
+    return mime_type_response("application/json", encoder=_dumps)(func)
+
+
+def json_response_cached(func: _View) -> _View:
+    """
+    Decorator like json_response for endpoints returning constant or low-cardinality payloads (health checks, version info...).
+    With the stdlib json encoder, small flat payloads are encoded once and then served from a cache.
+    
+    >>> @json_response_cached
+    >>> def version() -> dict:
+    >>>         return {'name': 'my-api', 'version': '1.0.2'}, 200
+    """
+    return mime_type_response("application/json", encoder=_dumps_cached)(func)
+
+
+def _stream_json_array(items: Iterable[Any]) -> Iterator[bytes]:
+    """Yield the json encoding of the items as a json array, one item at a time."""
+    yield b"["
+    first = True
+    for item in items:
+        if first:
+            first = False
+        else:
+            yield b","
+        yield _dumps(item)
+    yield b"]"
+
+
+def json_response_streaming(func: _View) -> _View:
+    """
+    Decorator to stream a json array response from any iterable of items decodable to json.
+    The items are encoded one at a time so the whole payload is never built in memory.
+    The request context is kept alive while streaming, so lazy iterables may still use request, g or a db session.
+    
+    >>> @json_response_streaming
+    >>> def my_endpoint() -> tuple:
+    >>>         return (row for row in fetch_rows()), 200
+    Response(<generator>, status=200, mimetype='application/json')
+    """
+    @functools.wraps(func)
+    def __callback__(*args: Any, **kwargs: Any) -> Any:
+        result = func(*args, **kwargs)
+        if isinstance(result, BaseResponse):
+            return result
+        body, status = result, 200
+        if isinstance(result, tuple):
+            if len(result) > 1:
+                body, status = result[0], result[1]
+            else:
+                body = result[0] if result else ()
+        return Response(
+            response=stream_with_context(_stream_json_array(body)),
+            status=status,
+            mimetype="application/json"
+        )
+    return __callback__
+
+
+# generated endpoint names of each app or blueprint, with the function they were generated for
+_ENDPOINTS: "weakref.WeakKeyDictionary[Any, Dict[str, _View]]" = weakref.WeakKeyDictionary()
 
 
 class RouteFactory:
     """Class to generate routes for http methods and paths."""
-    def __init__(self, app):
+    def __init__(self, app: Any) -> None:
         self.app = app
     
-    def __wrap_route(self, route, method, **options):
-        """Decorate the function on the flask @route for the route and method."""
-        methods = {m for m in options.get("methods", [])}
+    def __wrap_route(self, route: str, method: str, **options: Any) -> Callable[[_View], _View]:
+        """
+        Decorate the function on the flask @route for the route and method.
+        All the work happens at decoration time: the function itself is registered, without any wrapper.
+        """
+        methods = options.get("methods") or ()
         if method not in methods:
-            methods.add(method)
-        options["methods"] = [m for m in methods]
-        def __wrap(func):
-            def __callback__(*args, **kwargs):
-                return func(*args, **kwargs)
-            __callback__.__name__ = func.__name__ + str(id(__callback__))
-            return self.app.route(route, **options)(__callback__)
+            options["methods"] = (*methods, method)
+        def __wrap(func: _View) -> _View:
+            # flask blueprints reject dots in endpoint names
+            endpoint = options.get("endpoint")
+            if not endpoint:
+                endpoint = "{0}.{1}.{2}".format(func.__module__, func.__qualname__, method.lower()).replace(".", "_")
+                # functions sharing a qualified name (e.g. wrappers from a decorator without functools.wraps),
+                # looked up per app or blueprint since several factories may register on the same one
+                registered = _ENDPOINTS.setdefault(self.app, {})
+                if registered.setdefault(endpoint, func) is not func or \
+                        getattr(self.app, "view_functions", {}).get(endpoint) not in (None, func):
+                    endpoint = "{0}_{1}".format(endpoint, id(func))
+            return self.app.route(route, **dict(options, endpoint=endpoint))(func)
         return __wrap
 
-    def options(self, route, **options):
+    def options(self, route: str, **options: Any) -> Callable[[_View], _View]:
         """
         Create an endpoint for the route and method OPTIONS.
         
@@ -271,7 +476,7 @@ class RouteFactory:
         """
         return self.__wrap_route(route, 'OPTIONS', **options)
 
-    def get(self, route, **options):
+    def get(self, route: str, **options: Any) -> Callable[[_View], _View]:
         """
         Create an endpoint for the route and method GET.
         
@@ -281,7 +486,7 @@ class RouteFactory:
         """
         return self.__wrap_route(route, 'GET', **options)
 
-    def post(self, route, **options):
+    def post(self, route: str, **options: Any) -> Callable[[_View], _View]:
         """
         Create an endpoint for the route and method POST.
         
@@ -291,7 +496,7 @@ class RouteFactory:
         """
         return self.__wrap_route(route, 'POST', **options)
 
-    def put(self, route, **options):
+    def put(self, route: str, **options: Any) -> Callable[[_View], _View]:
         """
         Create an endpoint for the route and method PUT.
         
@@ -301,7 +506,7 @@ class RouteFactory:
         """
         return self.__wrap_route(route, 'PUT', **options)
 
-    def delete(self, route, **options):
+    def delete(self, route: str, **options: Any) -> Callable[[_View], _View]:
         """
         Create an endpoint for the route and method DELETE.
         
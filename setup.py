@@ -1,8 +1,42 @@
+import os
 from setuptools import setup
+from setuptools.command.build_ext import build_ext
 
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
+
+
+class optional_build_ext(build_ext):
+    """Build the compiled extensions when possible, falling back to the pure python modules otherwise."""
+    def run(self):
+        try:
+            build_ext.run(self)
+        except Exception as error:
+            print("Could not compile flask_wrappers, using the pure python modules:", error)
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except Exception as error:
+            print("Could not compile {0}, using the pure python module: {1}".format(ext.name, error))
+
+
+ext_modules = []
+if os.environ.get("FLASK_WRAPPERS_MYPYC"):
+    # opt-in: compile with mypyc from the type annotations instead of Cython
+    from mypyc.build import mypycify
+    ext_modules = mypycify(["flask_wrappers/wrappers.py"])
+elif cythonize is not None:
+    try:
+        ext_modules = cythonize(["flask_wrappers/wrappers.py"], language_level=3)
+    except Exception as error:
+        print("Could not cythonize flask_wrappers, using the pure python modules:", error)
+
 setup(
     name='flask_wrappers',
     packages=['flask_wrappers'],
@@ -20,5 +54,8 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
+    extras_require={'orjson': ['orjson'], 'ujson': ['ujson>=5.4']},
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
     python_requires='>=3'
 )